@@ -1 +1,2 @@
-from bho_scraper.bho_scraper import BHOScraper
+from bho_scraper.bho_scraper import BHOScraper, DeadlineExceeded
+from bho_scraper.result_store import SQLiteResultStore
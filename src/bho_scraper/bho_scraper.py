@@ -13,14 +13,34 @@ import re
 import requests
 import os
 import time
+import threading
 import numpy as np
 import pandas as pd
 import pickle 
 
-from urllib.parse import quote_plus
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from urllib.parse import quote_plus, urljoin
 from tqdm import tqdm as tqdm
 from bs4 import BeautifulSoup
 
+from bho_scraper.concordance import concordance
+from bho_scraper.documents import fetch_documents
+from bho_scraper.profiling import PhaseProfiler
+from bho_scraper.snapshot import SnapshotSeries, save_snapshot
+
+
+# Latency samples needed before hedged requests are issued
+HEDGE_MIN_SAMPLES = 20
+
+
+class DeadlineExceeded(Exception):
+    '''
+    Raised when a request would start after the scraper's job deadline has passed.
+    '''
+    pass
+
 
 def save_item_to_path(item, path, file_name):
     try:
@@ -42,16 +62,193 @@ def change_href(href):
     return href
 
 
+def find_num_pages(soup):
+    '''
+    Finds the number of pages after the first from the "Go to last page" link of a
+    results page: soup (BeautifulSoup).
+
+    Returns: num_pages (int), or None if there is no such link
+    '''
+    last_page_tag = 'a'
+    last_page_attributes = {'title' : 'Go to last page'}
+    try:
+        last_page     = soup.find(last_page_tag, last_page_attributes)
+        last_page_url = last_page['href']
+        pattern       = re.compile(r'&page=[0-9]+')
+        return int(pattern.findall(last_page_url)[0][6:])
+    except:
+        return None
+
+
 def standardize_query(query):
     p = re.compile(r'[\W_]+')
     return p.sub('', query).lower()
 
 class BHOScraper():
 
-    def __init__(self):
+    def __init__(self, result_store=None, timeout=(10, 60), deadline=None, hedge=False, session=None, cache=None, profile=False, recorder=None):
+        '''
+        If result_store (e.g. bho_scraper.SQLiteResultStore) is given, scraped results are
+        written to it and "scraped_series" reads from it instead of an in-memory dict.
+
+        timeout is the (connect, read) timeout in seconds passed to every request. deadline
+        (seconds) bounds each "scrape_series" call: no request starts once it has passed and
+        the results collected so far are kept. If hedge is True, a page request that runs
+        past the observed p95 latency is issued a second time and the first response wins.
+
+        session (requests.Session) and cache (bho_scraper.cache.ResponseCache) may be shared
+        between scrapers to reuse connections and page responses.
+
+        If profile is True, time spent in each phase of a run is sampled by a
+        bho_scraper.profiling.PhaseProfiler; see "write_profile".
+
+        If recorder (bho_scraper.recording.TrafficRecorder) is given, every request and its
+        response are recorded for replay.
+
+        "metadata" (dict) holds any job details to be kept with "save_state".
+        '''
         self.scraped_series = []
         self.catalogue = {}
         self.scraped_series = {}
+        self.result_store = result_store
+        if result_store is not None:
+            self.scraped_series = result_store
+        self.timeout  = timeout
+        self.deadline = deadline
+        self.hedge    = hedge
+        self.session  = session
+        self.cache    = cache
+        self.recorder = recorder
+        self.metadata = {}
+        self._lock = threading.RLock()
+        self._deadline_at    = None
+        self._latencies      = deque(maxlen=200)
+        self._hedge_executor = None
+        self.profiler = None
+        if profile:
+            self.profiler = PhaseProfiler()
+            self.profiler.start()
+
+
+    def _phase(self, name):
+        '''
+        Returns: a context manager marking a phase for the profiler (a no-op if not profiling)
+        '''
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.phase(name)
+
+
+    def write_profile(self, path):
+        '''
+        Stops profiling and writes a flamegraph-compatible profile.folded file and a
+        profile_summary.csv table of time per phase to path.
+
+        Returns: pandas.DataFrame summary
+        '''
+        if self.profiler is None:
+            raise ValueError('Profiling is not enabled. Create the scraper with "profile=True".')
+        self.profiler.stop()
+        return self.profiler.write(path)
+
+
+    def fetch(self, url):
+        '''
+        Requests url with "timeout", shortened to fit any remaining job deadline, and hedges
+        the request if "hedge" is set. Responses are served from "cache" if there is one.
+
+        Returns: requests.Response
+        '''
+        with self._phase('fetch'):
+            timeout = self._request_timeout()
+            if self.cache is not None:
+                return self.cache.get(url, lambda: self._fetch(url, timeout))
+
+            return self._fetch(url, timeout)
+
+
+    def _fetch(self, url, timeout):
+        if self.hedge:
+            with self._lock:
+                hedge_after = np.percentile(self._latencies, 95) if len(self._latencies) >= HEDGE_MIN_SAMPLES else None
+            if hedge_after is not None:
+                return self._hedged_fetch(url, timeout, hedge_after)
+
+        return self._timed_fetch(url, timeout)
+
+
+    def _request_timeout(self):
+        '''
+        Returns: the timeout for a request starting now, raising DeadlineExceeded if the job
+        deadline has passed.
+        '''
+        if self._deadline_at is None:
+            return self.timeout
+        remaining = self._deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline of {}s exceeded.'.format(self.deadline))
+        if self.timeout is None:
+            return remaining
+        if isinstance(self.timeout, tuple):
+            return tuple(min(t, remaining) if t is not None else remaining for t in self.timeout)
+        return min(self.timeout, remaining)
+
+
+    def _deadline_passed(self):
+        return self._deadline_at is not None and time.monotonic() >= self._deadline_at
+
+
+    def _timed_fetch(self, url, timeout):
+        get = self.session.get if self.session is not None else requests.get
+        start = time.monotonic()
+        r = get(url, timeout=timeout)
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._latencies.append(elapsed)
+        if self.recorder is not None:
+            self.recorder.record(url, r, start, elapsed)
+        return r
+
+
+    def _hedged_fetch(self, url, timeout, hedge_after):
+        '''
+        Requests url on a thread of its own and, if that request has not completed after
+        hedge_after seconds, issues a second one from a pool. Returns whichever successful
+        response arrives first, raising only once every request has failed.
+        '''
+        outcome = Future()
+        state   = {'sent' : 1, 'failed' : 0}
+        lock    = threading.Lock()
+
+        def attempt():
+            try:
+                r = self._timed_fetch(url, timeout)
+            except Exception as e:
+                with lock:
+                    state['failed'] += 1
+                    if state['failed'] == state['sent'] and not outcome.done():
+                        outcome.set_exception(e)
+                return None
+            with lock:
+                if not outcome.done():
+                    outcome.set_result(r)
+
+        # The first request starts now rather than queueing for a pool worker, so
+        # hedge_after is measured from when it is sent
+        threading.Thread(target=attempt, daemon=True).start()
+        wait([outcome], timeout=hedge_after)
+        with lock:
+            send_hedge = not outcome.done() and not self._deadline_passed()
+            if send_hedge:
+                state['sent'] += 1
+        if send_hedge:
+            with self._lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=8)
+                executor = self._hedge_executor
+            executor.submit(attempt)
+
+        return outcome.result()
 
 
     def scrape_catalogue(self, path=None):
@@ -62,39 +259,42 @@ class BHOScraper():
         
         Returns: None
         '''
-        catalogue      = self.catalogue
-        if catalogue:
-            raise Exception('Catalogue already exists. Reset using "self.reset_catalogue" before scraping again.')
-            return None
+        with self._phase('catalogue'):
+            catalogue      = self.catalogue
+            if catalogue:
+                raise Exception('Catalogue already exists. Reset using "self.reset_catalogue" before scraping again.')
+                return None
 
-        catalogue_url  = r'https://www.british-history.ac.uk/catalogue'
-        try:
-            catalogue_get  = requests.get(catalogue_url)
-        except:
-            raise Exception('Unknown error. Please try again.')
-        status_code    = catalogue_get.status_code
-        if status_code != 200:
-            raise Exception('Error: status code: {}'.format(status_code))
-        catalogue_html = catalogue_get.text
-        catalogue_soup = BeautifulSoup(catalogue_html, 'html.parser')
-        table_contents = catalogue_soup.find('table')
-        table_rows     = table_contents.find_all('tr')
-        for row in table_rows[1:]:
-            p            = re.compile(r'[\W_]+')
-            series_title = row.find_all('a')[0].text
-            series_title = p.sub('', series_title).lower()
-            series_href  = row.find_all('a')[0]['href']
-            series_href  = change_href(series_href)
-            pattern      = re.compile(r'no-series')
-            if not pattern.findall(series_href):
-                catalogue[series_title] = r'https://www.british-history.ac.uk/search/series' + series_href + r'?query={}&page={}'
-        if path:
-            save_item_to_path(catalogue, path, 'catalogue.pickle')
-
-        # Now update the catalogue attribute
-        self.catalogue = catalogue
+            catalogue_url  = r'https://www.british-history.ac.uk/catalogue'
+            try:
+                catalogue_get  = self.fetch(catalogue_url)
+            except DeadlineExceeded:
+                raise
+            except:
+                raise Exception('Unknown error. Please try again.')
+            status_code    = catalogue_get.status_code
+            if status_code != 200:
+                raise Exception('Error: status code: {}'.format(status_code))
+            catalogue_html = catalogue_get.text
+            catalogue_soup = BeautifulSoup(catalogue_html, 'html.parser')
+            table_contents = catalogue_soup.find('table')
+            table_rows     = table_contents.find_all('tr')
+            for row in table_rows[1:]:
+                p            = re.compile(r'[\W_]+')
+                series_title = row.find_all('a')[0].text
+                series_title = p.sub('', series_title).lower()
+                series_href  = row.find_all('a')[0]['href']
+                series_href  = change_href(series_href)
+                pattern      = re.compile(r'no-series')
+                if not pattern.findall(series_href):
+                    catalogue[series_title] = r'https://www.british-history.ac.uk/search/series' + series_href + r'?query={}&page={}'
+            if path:
+                save_item_to_path(catalogue, path, 'catalogue.pickle')
+
+            # Now update the catalogue attribute
+            self.catalogue = catalogue
 
-        return None
+            return None
 
 
     def reset_catalogue(self):
@@ -146,19 +346,30 @@ class BHOScraper():
         '''
         Collects query search results on page given by url.
         
-        Returns: pandas.DataFrame with columns ['title', 'publication', 'excerpt']
+        Returns: pandas.DataFrame with columns ['title', 'publication', 'excerpt', 'url']
         '''
         # Request html and create soup object
-        page_html = requests.get(url).text
-        soup = BeautifulSoup(page_html, 'html.parser')
+        page_html = self.fetch(url).text
+        with self._phase('parse'):
+            soup = BeautifulSoup(page_html, 'html.parser')
 
+            return self.parse_results(soup, url)
+
+
+    def parse_results(self, soup, page_url=''):
+        '''
+        Collects query search results from an already parsed results page: soup (BeautifulSoup).
+        Result links are resolved against page_url (string).
+        
+        Returns: pandas.DataFrame with columns ['title', 'publication', 'excerpt', 'url']
+        '''
         # Look for the view-content section
         tag = 'div'
         attributes = {'class' : 'view-content'}
         view_content = soup.find('div', {'class' : 'region region-content'}).find(tag, attributes)
         
         # Create dictionary to be filled with scraped data
-        content = {'title' : [], 'publication' : [], 'excerpt' : []}
+        content = {'title' : [], 'publication' : [], 'excerpt' : [], 'url' : []}
         
         # Scrape data from each row
         for row in view_content.find_all('div', recursive=False):
@@ -168,10 +379,18 @@ class BHOScraper():
             title_attributes = {'class' : 'title'}
             title = row.find(title_tag, title_attributes, recursive=False)
             try:
-                title = title.find('a').text
+                link  = title.find('a')
+                title = link.text
             except:
+                link  = None
                 title = np.nan
 
+            # Find the link to the document
+            try:
+                url = urljoin(page_url, link['href'])
+            except:
+                url = np.nan
+
             # Find the publication
             publication_excerpt_tag = 'p'
             publication_attributes = {'class' : 'publication'}
@@ -190,6 +409,7 @@ class BHOScraper():
             content['title'].append(title)
             content['publication'].append(publication)            
             content['excerpt'].append(excerpt)
+            content['url'].append(url)
 
         # Create dataframe containing scraped data
         df = pd.DataFrame(content)
@@ -197,7 +417,28 @@ class BHOScraper():
         return df
 
 
-    def scrape_series(self, series_queries, queries, path=None):
+    def scrape_first_page(self, first_page_url):
+        '''
+        Collects the first page of results for a query and the number of further pages
+        given by the "Go to last page" link.
+        
+        Returns: pandas.DataFrame (None if there are no results), num_pages (int)
+        '''
+        with self._phase('pagination'):
+            r = self.fetch(first_page_url)
+
+            first_page = r.text
+            with self._phase('parse'):
+                first_page_soup = BeautifulSoup(first_page, 'html.parser')
+            num_pages = find_num_pages(first_page_soup)
+        if num_pages is None:
+            return None, 0
+
+        with self._phase('parse'):
+            return self.parse_results(first_page_soup, first_page_url), num_pages
+
+
+    def scrape_series(self, series_queries, queries, path=None, max_workers=1, weights=None):
         '''
         Scrapes the title, publication and excerpt text from the series result retrurned by 
         searching for 'series_query' (string) which contain words in 'queries' (iterable). 
@@ -206,15 +447,35 @@ class BHOScraper():
         for each series_query.
 
         If path is given, saves data to <catalogue_url_reference>.csv file at path with columns: 
-        ['query', 'title', 'publication', 'excerpt'] for each series_query.
+        ['query', 'title', 'publication', 'excerpt', 'url'] for each series_query.
+
+        Pages from every series x query are fetched by a shared pool of 'max_workers' (int)
+        threads. Series take turns to claim workers so that one series with a huge result set
+        cannot stall the others; 'weights' (dict) optionally maps a series_query to the number
+        of pages it may claim per turn (default 1). Each query's results are merged into
+        "scraped_series" (and the .csv re-written) as soon as that query is complete.
+
+        If the scraper has a "deadline", pages not started by then are skipped and every query
+        keeps the pages already fetched.
         
         Returns: None
         '''
+        if self.deadline is not None:
+            self._deadline_at = time.monotonic() + self.deadline
+        try:
+            self._scrape_series(series_queries, queries, path, max_workers, weights)
+        finally:
+            self._deadline_at = None
+
+        return None
+
+
+    def _scrape_series(self, series_queries, queries, path, max_workers, weights):
         if type(queries) == str:
             queries = [queries]
         elif type(queries) != list:
             try:
-                queries = list(query)
+                queries = list(queries)
             except:
                 raise ValueError('Invalid "queries" entered.')
         if type(series_queries) == str:
@@ -224,67 +485,385 @@ class BHOScraper():
                 series_queries = list(series_queries)
             except:
                 raise ValueError('Invalid "series_queries" entered.')
+        if weights is None:
+            weights = {}
         
+        jobs = []
         for series_query in series_queries:
-            query_dfs = []
-            for query in queries:
-                print('Searching "{}" for "{}"...'.format(series_query, query))
-                base_url, series_name = self.search_for_series(series_query)
-                
+            base_url, series_name = self.search_for_series(series_query)
+            job = _SeriesJob(series_query, base_url, series_name, queries, weights.get(series_query, 1))
+            if base_url is None:
+                # Nothing can be fetched for an unknown series
+                job.tasks.clear()
+                job.remaining = [0] * len(queries)
+                job.failed = [True] * len(queries)
+            jobs.append(job)
+
+        progress = tqdm(total=0)
+        schedule = _round_robin(jobs)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                if self._deadline_passed():
+                    for job in jobs:
+                        if job.tasks:
+                            job.truncated = True
+                            self._drop_tasks(job, lambda task: True)
+
+                # Fill the worker budget, taking turns between series
+                while len(in_flight) < max_workers:
+                    item = next(schedule)
+                    if item is None:
+                        break
+                    job, (query_index, page) = item
+                    url = job.base_url.format(quote_plus(job.queries[query_index]), page)
+                    if page == 0:
+                        print('Searching "{}" for "{}"...'.format(job.series_query, job.queries[query_index]))
+                        future = executor.submit(self.scrape_first_page, url)
+                    else:
+                        future = executor.submit(self.scrape_results, url)
+                    in_flight[future] = (job, query_index, page)
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, query_index, page = in_flight.pop(future)
+                    self._handle_page(job, query_index, page, future, progress)
+                    self._commit_queries(job, path)
+        progress.close()
+
+        for job in jobs:
+            if job.truncated:
+                print('Deadline reached: results for "{}" are incomplete.'.format(job.series_query))
+            if not job.found:
+                print('No results for any of "queries" in {}.'.format(job.series_query))
 
-                try:
-                    first_page_url = base_url.format(quote_plus(query), 0)
+        return None  
+
+
+    def _handle_page(self, job, query_index, page, future, progress):
+        '''
+        Records the result of a finished page fetch against its series job.
+        '''
+        query = job.queries[query_index]
+        job.remaining[query_index] = (job.remaining[query_index] or 1) - 1
+        try:
+            if page == 0:
+                df, num_pages = future.result()
+                if df is None:
+                    print('No results for "{}" in "{}"'.format(query, job.series_query))
+                    return None
+                job.pages[query_index][0] = df
+                job.remaining[query_index] = num_pages
+                job.tasks.extend((query_index, i) for i in range(1, num_pages + 1))
+                progress.total += num_pages
+                progress.refresh()
+            else:
+                progress.update(1)
+                job.pages[query_index][page] = future.result()
+        except DeadlineExceeded:
+            # Keep what was fetched in time; the scheduler drops the remaining pages
+            job.truncated = True
+        except requests.Timeout:
+            # Read timeouts are clipped to the deadline, so a page still in flight when it
+            # passes times out rather than raising DeadlineExceeded
+            if not self._deadline_passed():
+                job.failed[query_index] = True
+                self._drop_tasks(job, lambda task: task[0] == query_index)
+            else:
+                job.truncated = True
+        except:
+            # A failed page drops the whole query, as with a sequential scrape
+            job.failed[query_index] = True
+            self._drop_tasks(job, lambda task: task[0] == query_index)
 
-                        
+        return None
 
-                    r = requests.get(first_page_url)
 
-                    first_page = r.text
-                    first_page_soup = BeautifulSoup(first_page, 'html.parser')
-                    last_page_tag = 'a'
-                    last_page_attributes = {'title' : 'Go to last page'}
+    def _drop_tasks(self, job, predicate):
+        '''
+        Removes the queued tasks of a series job matching predicate, so they no longer count
+        towards their query's remaining pages.
+        '''
+        for task in job.tasks:
+            if predicate(task):
+                job.remaining[task[0]] = max((job.remaining[task[0]] or 0) - 1, 0)
+        job.tasks = deque(task for task in job.tasks if not predicate(task))
 
-                    try:
-                        last_page     = first_page_soup.find(last_page_tag, last_page_attributes)
-                        last_page_url = last_page['href']
-                        pattern       = re.compile(r'&page=[0-9]+')
-                        num_pages     = int(pattern.findall(last_page_url)[0][6:])
-                        dfs           = [self.scrape_results(first_page_url)]
-                    except:
-                        print('No results for "{}" in "{}"'.format(query, series_query))
-                        num_pages = 0
-                        dfs       = []
-
-                    for i in tqdm(range(1, num_pages + 1)):
-                        df = self.scrape_results(base_url.format(quote_plus(query), i))
-                        dfs.append(df)
-
-                    if dfs:
-                        query_df = pd.concat(dfs, axis=0)
-                        query_df['query'] = query
-                        query_df = pd.concat([query_df.iloc[:,-1], query_df.iloc[:,:-1]], axis=1)
-                        query_dfs.append(query_df)
-                except:
-                    pass
-            if query_dfs:
+        return None
+
+
+    def _commit_queries(self, job, path):
+        '''
+        Merges every completed query of a series job into "scraped_series", in query order,
+        and re-writes the series .csv file if path is given.
+        '''
+        query_dfs = []
+        with self._phase('assembly'):
+            while job.committed < len(job.queries) and job.remaining[job.committed] == 0:
+                query_index = job.committed
+                pages = job.pages[query_index]
+                if pages and not job.failed[query_index]:
+                    query_df = pd.concat([pages[i] for i in sorted(pages)], axis=0)
+                    query_df['query'] = job.queries[query_index]
+                    query_df = pd.concat([query_df.iloc[:,-1], query_df.iloc[:,:-1]], axis=1)
+                    query_dfs.append(query_df)
+                job.pages[query_index] = {}
+                job.committed += 1
+
+        if not query_dfs:
+            return None
+
+        job.found = True
+        series_query = job.series_query
+        with self._lock:
+            if self.result_store is not None:
+                with self._phase('output'):
+                    # The store drops duplicates on insert, so only new rows need writing
+                    new_df = self.result_store.upsert(series_query, pd.concat(query_dfs, axis=0))
+                    if path:
+                        self._append_series_csv(path, job.series_name, series_query, new_df)
+                return None
+            with self._phase('assembly'):
                 series_df = pd.concat(query_dfs, axis=0)
                 if series_query in self.scraped_series.keys():
                     df_existing = self.scraped_series[series_query]
                     series_df = pd.concat([df_existing, series_df], axis=0, ignore_index=True)
                 series_df.drop_duplicates(inplace=True, ignore_index=True)
                 self.scraped_series[series_query] = series_df
-                if path:
-                    try:
-                        if not os.path.exists(path):
-                            os.mkdir(path)
-                        save_location = os.path.join(path, '{}.csv'.format(series_name))
+            if path:
+                try:
+                    if not os.path.exists(path):
+                        os.mkdir(path)
+                    save_location = os.path.join(path, '{}.csv'.format(job.series_name))
+                    with self._phase('output'):
                         series_df.to_csv(save_location, index=False)
+                except:
+                    raise ValueError('Please enter a valid path.')
+
+        return None
+
+
+    def _append_series_csv(self, path, series_name, series_query, new_df):
+        '''
+        Appends the rows newly added to the result store to the series .csv file at path,
+        writing every stored row for the series if the file does not exist yet.
+        '''
+        try:
+            if not os.path.exists(path):
+                os.mkdir(path)
+            save_location = os.path.join(path, '{}.csv'.format(series_name))
+            if not os.path.exists(save_location):
+                self.result_store.fetch(series_query).to_csv(save_location, index=False)
+            elif len(new_df):
+                new_df.to_csv(save_location, mode='a', header=False, index=False)
+        except:
+            raise ValueError('Please enter a valid path.')
+
+        return None
+
+
+    def survey(self, queries, series_queries=None, max_workers=1):
+        '''
+        Estimates the number of hits for each of 'queries' (iterable) in each of
+        'series_queries' (iterable), fetching only the first page of results for each.
+        If series_queries is None, every series in the catalogue is surveyed.
+
+        The estimate is the number of results on the first page times the number of pages,
+        so may overcount by up to one page (the last page can be partly full).
+        
+        Returns: pandas.DataFrame indexed by series_query with a column per query
+                 (NaN where the series was not found or the request failed)
+        '''
+        if type(queries) == str:
+            queries = [queries]
+        queries = list(queries)
+        if series_queries is None:
+            if not self.catalogue:
+                self.scrape_catalogue()
+            series_queries = list(self.catalogue.keys())
+        elif type(series_queries) == str:
+            series_queries = [series_queries]
+        series_queries = list(series_queries)
+
+        tasks = []
+        for series_query in series_queries:
+            base_url, _ = self.search_for_series(series_query)
+            if base_url is None:
+                continue
+            for query in queries:
+                tasks.append((series_query, query, base_url.format(quote_plus(query), 0)))
+
+        counts = pd.DataFrame(np.nan, index=pd.Index(series_queries, name='series'), columns=queries)
+        if self.deadline is not None:
+            self._deadline_at = time.monotonic() + self.deadline
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self._survey_page, url) : (series_query, query) for series_query, query, url in tasks}
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    series_query, query = futures[future]
+                    try:
+                        counts.loc[series_query, query] = future.result()
                     except:
-                        raise ValueError('Please enter a valid path.')
-            else:
-                print('No results for any of "queries" in {}.'.format(series_query))
+                        pass
+        finally:
+            self._deadline_at = None
 
-        return None  
+        return counts
+
+
+    def _survey_page(self, first_page_url):
+        '''
+        Returns: estimated number of results (int) from the first page of a query
+        '''
+        r = self.fetch(first_page_url)
+        if r.status_code != 200:
+            raise Exception('Error: status code: {}'.format(r.status_code))
+        with self._phase('parse'):
+            soup = BeautifulSoup(r.text, 'html.parser')
+            region = soup.find('div', {'class' : 'region region-content'})
+            if region is None:
+                # e.g. a maintenance page, which says nothing about the number of hits
+                raise ValueError('Not a results page: {}'.format(first_page_url))
+            if region.find('div', {'class' : 'view-content'}) is None:
+                # A results page with no results listing
+                return 0
+            per_page  = len(self.parse_results(soup))
+            num_pages = find_num_pages(soup) or 0
+
+        return per_page * (num_pages + 1)
+
+
+    def fetch_documents(self, path, max_workers=4):
+        '''
+        Downloads the document behind every result url in "scraped_series" into
+        content-addressed storage at path. Each document is fetched once, however many
+        series x query rows link to it, and documents already stored are skipped.
+        See "bho_scraper.documents.fetch_documents".
+
+        Returns: pandas.DataFrame with columns ['url', 'document_url', 'sha256', 'path']
+        '''
+        urls = []
+        for series_query in self.scraped_series.keys():
+            df = self.scraped_series[series_query]
+            if 'url' in df.columns:
+                urls.extend(df['url'].dropna().unique())
+
+        return fetch_documents(urls, path, self._fetch_document, max_workers=max_workers)
+
+
+    def _fetch_document(self, url):
+        # Documents bypass the response cache, which is meant for result pages
+        with self._phase('fetch'):
+            r = self._fetch(url, self._request_timeout())
+        if r.status_code != 200:
+            raise Exception('Error: status code: {}'.format(r.status_code))
+        return r.content
+
+
+    def save_state(self, path):
+        '''
+        Saves the catalogue, every series in "scraped_series", the scraper settings and
+        "metadata" to a single snapshot file at path (requires pyarrow).
+        See "bho_scraper.snapshot".
+
+        Returns: None
+        '''
+        settings = {
+            'timeout'  : list(self.timeout) if isinstance(self.timeout, tuple) else self.timeout,
+            'deadline' : self.deadline,
+            'hedge'    : self.hedge,
+        }
+        with self._lock:
+            save_snapshot(path, self.catalogue, self.scraped_series, {'settings' : settings, 'job' : self.metadata})
+
+        return None
+
+
+    def load_state(self, path, restore_settings=False):
+        '''
+        Restores the catalogue, scraped series and "metadata" from a snapshot saved by
+        "save_state". The file is memory-mapped and each series is only read when it is
+        first used.
+
+        The scraper's timeout, deadline and hedge are kept unless restore_settings is True,
+        in which case those saved with the snapshot are used.
+
+        Returns: None
+        '''
+        if self.result_store is not None:
+            raise ValueError('Cannot load a snapshot into a scraper that uses a result store.')
+        scraped_series = SnapshotSeries(path)
+        header   = scraped_series.header
+        settings = header['metadata'].get('settings', {})
+        with self._lock:
+            self.catalogue      = header['catalogue']
+            self.scraped_series = scraped_series
+            self.metadata       = header['metadata'].get('job', {})
+            if restore_settings:
+                if 'timeout' in settings:
+                    self.timeout = tuple(settings['timeout']) if isinstance(settings['timeout'], list) else settings['timeout']
+                self.deadline = settings.get('deadline', self.deadline)
+                self.hedge    = settings.get('hedge', self.hedge)
+
+        return None
+
+
+    def concordance(self, width=40):
+        '''
+        Computes keyword-in-context windows for every series in "scraped_series".
+        See "bho_scraper.concordance.concordance".
+
+        Returns: dict of series_query -> pandas.DataFrame
+        '''
+        return {
+            series_query : concordance(self.scraped_series[series_query], width=width)
+            for series_query in self.scraped_series.keys()
+        }
+
+
+class _SeriesJob():
+    '''
+    Book-keeping for the pages of one series while it is being scraped.
+
+    Tasks are (query_index, page) pairs; page 0 is the first page, which also discovers
+    how many further pages the query has.
+    '''
+    def __init__(self, series_query, base_url, series_name, queries, weight=1):
+        self.series_query = series_query
+        self.base_url     = base_url
+        self.series_name  = series_name
+        self.queries      = queries
+        self.weight       = max(int(weight), 1)
+        self.tasks        = deque((i, 0) for i in range(len(queries)))
+        # Pages still to be fetched per query (None until the first page is back)
+        self.remaining    = [None] * len(queries)
+        self.pages        = [{} for _ in queries]
+        self.failed       = [False] * len(queries)
+        self.committed    = 0
+        self.found        = False
+        self.truncated    = False
+
+
+def _round_robin(jobs):
+    '''
+    Yields (job, task) pairs taking up to "job.weight" tasks from each series job in turn.
+
+    Yields None whenever every job's task queue is empty, so that the caller can wait for
+    in-flight pages to add more tasks.
+    '''
+    while True:
+        idle = True
+        for job in jobs:
+            for _ in range(job.weight):
+                if not job.tasks:
+                    break
+                idle = False
+                yield job, job.tasks.popleft()
+        if idle:
+            yield None
 
 
 
@@ -0,0 +1,92 @@
+'''
+Class: ResponseCache
+--------------------
+- An in-memory cache of page responses that can be shared by several BHOScraper instances.
+  Concurrent requests for a URL that is already being fetched wait for that fetch instead
+  of issuing their own.
+'''
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ResponseCache():
+    '''
+    Caches successful (status code 200) responses by URL for ttl (seconds), keeping at most
+    max_entries responses and evicting the least recently used first.
+    '''
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self.hits        = 0
+        self.misses      = 0
+        self.coalesced   = 0
+        self._lock       = threading.Lock()
+        self._entries    = OrderedDict()
+        self._in_flight  = {}
+
+
+    def get(self, url, fetch):
+        '''
+        Returns the cached response for url, otherwise the response of an identical request
+        already in flight, otherwise the result of calling fetch().
+
+        Returns: requests.Response
+        '''
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(url)
+                self.hits += 1
+                return entry[1]
+            future = self._in_flight.get(url)
+            owner  = future is None
+            if owner:
+                future = Future()
+                self._in_flight[url] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            response = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[url]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if response.status_code == 200:
+                self._entries[url] = (time.monotonic() + self.ttl, response)
+                self._entries.move_to_end(url)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            del self._in_flight[url]
+        future.set_result(response)
+
+        return response
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        '''
+        Returns: dict of cache counters
+        '''
+        with self._lock:
+            return {
+                'entries'   : len(self._entries),
+                'hits'      : self.hits,
+                'misses'    : self.misses,
+                'coalesced' : self.coalesced,
+            }
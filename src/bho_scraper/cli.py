@@ -7,6 +7,7 @@ A cli application for bho_scraper.
 
 import click
 from bho_scraper.bho_scraper import BHOScraper
+from bho_scraper.service import ScrapeService
 
 DEFAULT_DOWNLOAD = False
 
@@ -14,13 +15,59 @@ DEFAULT_DOWNLOAD = False
 @click.argument("series")
 @click.argument("queries")
 @click.argument("path")
-def scrape(series, queries, path):
+@click.option("--max-workers", default=1, show_default=True, help="Number of pages fetched concurrently across all series.")
+@click.option("--timeout", default=60.0, show_default=True, help="Read timeout for each request, in seconds.")
+@click.option("--deadline", default=None, type=float, help="Stop starting new requests after this many seconds.")
+@click.option("--hedge", is_flag=True, help="Re-issue requests slower than the observed p95 latency.")
+@click.option("--documents", default=None, help="Also download each linked document once into this directory.")
+@click.option("--profile", default=None, help="Profile the run by phase and write the results to this directory.")
+def scrape(series, queries, path, max_workers, timeout, deadline, hedge, documents, profile):
 
     series  = [str(item) for item in series.strip('[]').split(',')]
     queries = [str(item) for item in queries.strip('[]').split(',')]
-    scraper = BHOScraper()
-    scraper.scrape_series(series, queries, path)
+    scraper = BHOScraper(timeout=(10, timeout), deadline=deadline, hedge=hedge, profile=bool(profile))
+    scraper.scrape_series(series, queries, path, max_workers=max_workers)
+    if documents:
+        scraper.fetch_documents(documents, max_workers=max_workers)
 
     click.echo("==================== SCRAPING COMPLETED ====================")
     click.echo("*.csv files saved to: {}".format(path))
-    click.echo("============================================================")
\ No newline at end of file
+    if profile:
+        summary = scraper.write_profile(profile)
+        click.echo(summary.to_string())
+        click.echo("Profile saved to: {}".format(profile))
+    click.echo("============================================================")
+
+
+@click.command()
+@click.argument("queries")
+@click.argument("path")
+@click.option("--series", default=None, help="Series to survey, as \"[<series_a>, <series_b>,...]\". Defaults to the whole catalogue.")
+@click.option("--max-workers", default=1, show_default=True, help="Number of pages fetched concurrently.")
+def survey(queries, path, series, max_workers):
+
+    queries = [str(item) for item in queries.strip('[]').split(',')]
+    if series is not None:
+        series = [str(item) for item in series.strip('[]').split(',')]
+    scraper = BHOScraper()
+    counts  = scraper.survey(queries, series, max_workers=max_workers)
+    counts.to_csv(path)
+
+    click.echo("==================== SURVEY COMPLETED ======================")
+    click.echo("Estimated hit counts saved to: {}".format(path))
+    click.echo("============================================================")
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8765, show_default=True)
+@click.option("--job-workers", default=2, show_default=True, help="Number of jobs run at once.")
+@click.option("--max-workers", default=4, show_default=True, help="Number of pages each job fetches concurrently.")
+def serve(host, port, job_workers, max_workers):
+
+    service = ScrapeService(host=host, port=port, job_workers=job_workers, max_workers=max_workers)
+    service.warm()
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.shutdown()
\ No newline at end of file
@@ -0,0 +1,119 @@
+'''
+Class: DocumentStore
+--------------------
+- Content-addressed local storage for the documents linked from scraped results. Each
+  document is fetched once, however many series x query rows link to it, and saved under
+  the SHA-256 of its content, so identical documents are also only stored once.
+'''
+import hashlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urldefrag
+from tqdm import tqdm as tqdm
+
+
+INDEX_FILE = 'index.csv'
+
+
+def document_url(url):
+    '''
+    Removes the fragment from a result url, since results on different parts of a document
+    link to the same page.
+
+    Returns: string
+    '''
+    return urldefrag(url)[0]
+
+
+class DocumentStore():
+    '''
+    Stores documents at path (string) as objects/<sha[:2]>/<sha>.html, with an index.csv file
+    mapping each document url to the SHA-256 of its content.
+    '''
+
+    def __init__(self, path):
+        self.path  = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            index = pd.read_csv(index_path)
+            self.index = dict(zip(index['document_url'], index['sha256']))
+        else:
+            self.index = {}
+
+
+    def object_path(self, sha256):
+        return os.path.join(self.path, 'objects', sha256[:2], sha256 + '.html')
+
+
+    def add(self, url, content):
+        '''
+        Saves content (bytes) fetched from url (string), unless identical content is already
+        stored.
+
+        Returns: sha256 (string)
+        '''
+        sha256 = hashlib.sha256(content).hexdigest()
+        object_path = self.object_path(sha256)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = '{}.{}.tmp'.format(object_path, threading.get_ident())
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, object_path)
+        with self._lock:
+            self.index[url] = sha256
+
+        return sha256
+
+
+    def save_index(self):
+        with self._lock:
+            index = pd.DataFrame({'document_url' : list(self.index.keys()), 'sha256' : list(self.index.values())})
+        index.to_csv(os.path.join(self.path, INDEX_FILE), index=False)
+
+        return None
+
+
+    def __contains__(self, url):
+        return url in self.index
+
+
+def fetch_documents(urls, path, fetch, max_workers=4):
+    '''
+    Downloads each unique document linked to by urls (iterable) into a DocumentStore at
+    path (string), skipping documents already in the store. fetch is called with a
+    document url and must return its content (bytes).
+
+    Returns: pandas.DataFrame with columns ['url', 'document_url', 'sha256', 'path'],
+             one row per unique url (sha256 and path are NaN if the fetch failed)
+    '''
+    store = DocumentStore(path)
+    urls  = pd.Series(list(urls), dtype=object).dropna().drop_duplicates()
+    documents = urls.map(document_url)
+    missing   = [url for url in documents.drop_duplicates() if url not in store]
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, url) : url for url in missing}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            try:
+                store.add(futures[future], future.result())
+            except:
+                failed += 1
+    store.save_index()
+    if failed:
+        print('Failed to fetch {} of {} documents.'.format(failed, len(missing)))
+
+    sha256 = documents.map(lambda url: store.index.get(url, np.nan))
+    return pd.DataFrame({
+        'url'          : urls.values,
+        'document_url' : documents.values,
+        'sha256'       : sha256.values,
+        'path'         : sha256.map(lambda sha: store.object_path(sha) if isinstance(sha, str) else np.nan).values,
+    })
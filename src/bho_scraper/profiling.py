@@ -0,0 +1,151 @@
+'''
+Class: PhaseProfiler
+--------------------
+- A sampling profiler that separates a scrape run into phases (catalogue, pagination, fetch,
+  parse, assembly, output). Code marks phases with "PhaseProfiler.phase"; a background
+  thread periodically samples the stack of every thread inside a phase and files it under
+  the innermost phase, so network waits in "fetch" are kept apart from parsing.
+
+  Writes stacks in the folded format read by flamegraph.pl and speedscope, plus a summary
+  table of calls, wall time, CPU time and samples per phase.
+'''
+import os
+import sys
+import threading
+import time
+import pandas as pd
+
+from collections import Counter
+from contextlib import contextmanager
+
+
+PHASES = ['catalogue', 'pagination', 'fetch', 'parse', 'assembly', 'output']
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), frame.f_lineno)
+
+
+class PhaseProfiler():
+    '''
+    Samples threads inside a phase every interval (seconds).
+    '''
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples  = Counter()
+        self.stats    = {}
+        self._active  = {}
+        self._lock    = threading.Lock()
+        self._stop    = threading.Event()
+        self._thread  = None
+
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+
+        return None
+
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+        return None
+
+
+    @contextmanager
+    def phase(self, name):
+        '''
+        Marks the calling thread as being in phase name (string) for the duration of the
+        with block. Phases may be nested; wall and CPU times are inclusive of nested phases.
+        '''
+        stack = self._active.setdefault(threading.get_ident(), [])
+        stack.append(name)
+        wall = time.perf_counter()
+        cpu  = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu  = time.thread_time() - cpu
+            stack.pop()
+            with self._lock:
+                stats = self.stats.setdefault(name, {'calls' : 0, 'wall' : 0.0, 'cpu' : 0.0, 'samples' : 0})
+                stats['calls'] += 1
+                stats['wall']  += wall
+                stats['cpu']   += cpu
+
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, stack in list(self._active.items()):
+                if ident == own:
+                    continue
+                # The thread may leave its phase at any point, so the phase is read once,
+                # before its frames
+                try:
+                    phase = stack[-1]
+                except IndexError:
+                    continue
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                try:
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                except Exception:
+                    # Skip a sample that cannot be read rather than stop sampling
+                    continue
+                with self._lock:
+                    self.samples[';'.join([phase] + labels[::-1])] += 1
+                    stats = self.stats.setdefault(phase, {'calls' : 0, 'wall' : 0.0, 'cpu' : 0.0, 'samples' : 0})
+                    stats['samples'] += 1
+
+
+    def summary(self):
+        '''
+        Returns: pandas.DataFrame indexed by phase with columns ['calls', 'wall_s', 'cpu_s',
+                 'samples', 'sample_share']
+        '''
+        with self._lock:
+            stats = {phase : dict(values) for phase, values in self.stats.items()}
+        order = [phase for phase in PHASES if phase in stats] + sorted(set(stats) - set(PHASES))
+        summary = pd.DataFrame(
+            [[stats[phase]['calls'], stats[phase]['wall'], stats[phase]['cpu'], stats[phase]['samples']] for phase in order],
+            index=pd.Index(order, name='phase'),
+            columns=['calls', 'wall_s', 'cpu_s', 'samples']
+        )
+        total = summary['samples'].sum()
+        summary['sample_share'] = summary['samples'] / total if total else 0.0
+
+        return summary
+
+
+    def write(self, path):
+        '''
+        Writes profile.folded (flamegraph input) and profile_summary.csv to path.
+
+        Returns: pandas.DataFrame summary (see "summary")
+        '''
+        if not os.path.exists(path):
+            os.makedirs(path)
+        with self._lock:
+            samples = sorted(self.samples.items())
+        with open(os.path.join(path, 'profile.folded'), 'w') as f:
+            for stack, count in samples:
+                f.write('{} {}\n'.format(stack, count))
+        summary = self.summary()
+        summary.to_csv(os.path.join(path, 'profile_summary.csv'))
+
+        return summary
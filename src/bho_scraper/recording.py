@@ -0,0 +1,141 @@
+'''
+Record and replay of scraper traffic.
+
+- TrafficRecorder captures every request a BHOScraper makes (url, status code, body,
+  start offset and latency) and saves them to a compact gzipped JSON-lines file.
+- replay_traffic re-issues a recording against a server (e.g. a replay server serving the
+  same recording) at the original pace, faster, or multiplied for load testing, and
+  reports throughput and latency.
+'''
+import gzip
+import json
+import threading
+import time
+import numpy as np
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+RECORDING_VERSION = 1
+
+
+def recording_key(url):
+    '''
+    Returns: the path and query string of url (string), which identify a recorded response
+             independently of the host it was recorded from
+    '''
+    parts = urlsplit(url)
+    key = parts.path or '/'
+    if parts.query:
+        key += '?' + parts.query
+    return key
+
+
+class TrafficRecorder():
+    '''
+    Collects request/response pairs; pass as "recorder" to a BHOScraper.
+    '''
+
+    def __init__(self):
+        self.records = []
+        self._lock   = threading.Lock()
+        self._start  = time.monotonic()
+
+
+    def record(self, url, response, started, elapsed):
+        '''
+        Records the response (requests.Response) to url (string), requested at started
+        (time.monotonic) and taking elapsed (seconds).
+        '''
+        record = {
+            'url'         : url,
+            'status_code' : response.status_code,
+            'offset'      : started - self._start,
+            'elapsed'     : elapsed,
+            'body'        : response.text,
+        }
+        with self._lock:
+            self.records.append(record)
+
+        return None
+
+
+    def save(self, path):
+        '''
+        Writes the records, in the order the requests started, to path as gzipped JSON lines.
+        '''
+        with self._lock:
+            records = sorted(self.records, key=lambda record: record['offset'])
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'version' : RECORDING_VERSION}) + '\n')
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+        return None
+
+
+def load_recording(path):
+    '''
+    Returns: list of record dicts saved by "TrafficRecorder.save"
+    '''
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != RECORDING_VERSION:
+            raise ValueError('Unsupported recording version: {}'.format(header.get('version')))
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_traffic(records, base_url, speed=1.0, multiplier=1, max_workers=8, timeout=(10, 60)):
+    '''
+    Re-issues the recorded requests against base_url (string). Requests start at their
+    recorded offsets divided by speed (float; None sends them as fast as possible), and
+    each is sent multiplier (int) times.
+
+    Returns: dict with the number of requests, errors (failed or wrong status code),
+             mismatches (different body), elapsed seconds, requests per second and
+             p50/p95 latency in seconds
+    '''
+    base_url = base_url.rstrip('/')
+    tasks = [record for record in records for _ in range(multiplier)]
+    latencies, errors, mismatches = [], [0], [0]
+    lock = threading.Lock()
+
+    def send(record):
+        try:
+            start = time.monotonic()
+            r = requests.get(base_url + recording_key(record['url']), timeout=timeout)
+            latency = time.monotonic() - start
+        except requests.RequestException:
+            with lock:
+                errors[0] += 1
+            return None
+        with lock:
+            latencies.append(latency)
+            if r.status_code != record['status_code']:
+                errors[0] += 1
+            elif r.text != record['body']:
+                mismatches[0] += 1
+
+        return None
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for record in tasks:
+            if speed:
+                delay = record['offset'] / speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(send, record)
+    elapsed = time.monotonic() - start
+
+    return {
+        'requests'            : len(tasks),
+        'errors'              : errors[0],
+        'mismatches'          : mismatches[0],
+        'elapsed'             : elapsed,
+        'requests_per_second' : len(tasks) / elapsed if elapsed else np.nan,
+        'p50'                 : np.percentile(latencies, 50) if latencies else np.nan,
+        'p95'                 : np.percentile(latencies, 95) if latencies else np.nan,
+    }
@@ -0,0 +1,144 @@
+'''
+Class: SQLiteResultStore
+------------------------
+- A persistent store for scraped results, usable in place of the in-memory "scraped_series"
+  dict of a BHOScraper. Each row is keyed by a fingerprint of its series and contents so that
+  duplicates are dropped on insert by a unique index, rather than by re-deduplicating every
+  row already scraped.
+'''
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = ['query', 'title', 'publication', 'excerpt', 'url']
+
+
+def fingerprint_rows(series, df):
+    '''
+    Computes a fingerprint for each row of df (pandas.DataFrame) scraped from series (string).
+    Missing values are distinguished from empty strings.
+
+    Returns: list of strings
+    '''
+    fingerprints = []
+    for row in df[COLUMNS].itertuples(index=False, name=None):
+        values = [series] + ['\x00' if pd.isna(value) else str(value) for value in row]
+        fingerprints.append(hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest())
+    return fingerprints
+
+
+class SQLiteResultStore():
+    '''
+    Stores scraped results in an SQLite database at path (string).
+
+    Behaves like a read-only dict of series_query -> pandas.DataFrame, so it can stand in
+    for "BHOScraper.scraped_series".
+    '''
+
+    def __init__(self, path='bho_results.sqlite'):
+        self.path        = path
+        self._lock       = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'fingerprint TEXT NOT NULL, '
+                'series TEXT NOT NULL, '
+                + ', '.join('"{}" TEXT'.format(column) for column in COLUMNS) + ')'
+            )
+            self._connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS results_fingerprint ON results (fingerprint)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_series ON results (series)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_query ON results (series, "query")')
+
+
+    def upsert(self, series, df):
+        '''
+        Inserts the rows of df (pandas.DataFrame with columns ['query', 'title', 'publication',
+        'excerpt', 'url']) for series (string), skipping rows already stored.
+
+        Returns: pandas.DataFrame of the rows that were new
+        '''
+        df = df.reindex(columns=COLUMNS).reset_index(drop=True)
+        fingerprints = fingerprint_rows(series, df)
+        records = [
+            [fingerprint, series] + [None if pd.isna(value) else str(value) for value in row]
+            for fingerprint, row in zip(fingerprints, df.itertuples(index=False, name=None))
+        ]
+        placeholders = ', '.join(['?'] * (len(COLUMNS) + 2))
+        columns = ', '.join('"{}"'.format(column) for column in COLUMNS)
+        new_rows = []
+        with self._lock, self._connection:
+            for i, record in enumerate(records):
+                cursor = self._connection.execute(
+                    'INSERT OR IGNORE INTO results (fingerprint, series, {}) VALUES ({})'.format(columns, placeholders),
+                    record
+                )
+                if cursor.rowcount:
+                    new_rows.append(i)
+
+        return df.iloc[new_rows].reset_index(drop=True)
+
+
+    def fetch(self, series=None, query=None):
+        '''
+        Collects stored rows, optionally restricted to series (string) and query (string),
+        in the order they were first inserted.
+
+        Returns: pandas.DataFrame with columns ['query', 'title', 'publication', 'excerpt', 'url']
+        '''
+        conditions, parameters = [], []
+        if series is not None:
+            conditions.append('series = ?')
+            parameters.append(series)
+        if query is not None:
+            conditions.append('"query" = ?')
+            parameters.append(query)
+        sql = 'SELECT {} FROM results'.format(', '.join('"{}"'.format(column) for column in COLUMNS))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id'
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        return df.where(df.notna(), np.nan)
+
+
+    def keys(self):
+        '''
+        Returns: list of stored series, in the order they were first inserted.
+        '''
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT series FROM results GROUP BY series ORDER BY MIN(id)'
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+    def __getitem__(self, series):
+        if series not in self:
+            raise KeyError(series)
+        return self.fetch(series)
+
+
+    def __contains__(self, series):
+        with self._lock:
+            row = self._connection.execute('SELECT 1 FROM results WHERE series = ? LIMIT 1', [series]).fetchone()
+        return row is not None
+
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+    def __len__(self):
+        return len(self.keys())
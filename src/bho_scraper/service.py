@@ -0,0 +1,333 @@
+'''
+Class: ScrapeService
+--------------------
+- A long-running scrape service with a small local HTTP/JSON API. The catalogue, the
+  connection pool and a response cache are kept warm between jobs, and identical page
+  requests from concurrent jobs are coalesced into one.
+
+Endpoints:
+- POST /jobs                 {"series": [...], "queries": [...], "max_workers": 1}
+- GET  /jobs                 status of every job
+- GET  /jobs/<id>            status of one job
+- GET  /jobs/<id>/results    rows scraped so far, one JSON object per line
+                             (add "?follow=1" to keep streaming until the job finishes)
+- DELETE /jobs/<id>          forget a finished job and its results
+- GET  /status               catalogue size and cache counters
+'''
+import json
+import threading
+import time
+import uuid
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+
+from bho_scraper.bho_scraper import BHOScraper
+from bho_scraper.cache import ResponseCache
+
+
+class ScrapeJob():
+    '''
+    A scrape of series x queries submitted to a ScrapeService.
+    '''
+
+    def __init__(self, series, queries, max_workers=1):
+        self.id          = uuid.uuid4().hex
+        self.series      = series
+        self.queries     = queries
+        self.max_workers = max_workers
+        self.status      = 'queued'
+        self.error       = None
+        self.scraper     = None
+        self.submitted   = time.time()
+        self.started     = None
+        self.finished    = None
+
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+
+    def results(self):
+        '''
+        Returns: dict of series_query -> pandas.DataFrame scraped so far
+        '''
+        # Read once, since the service drops the scraper when the job is evicted
+        scraper = self.scraper
+        if scraper is None:
+            return {}
+        with scraper._lock:
+            return {series : scraper.scraped_series[series] for series in list(scraper.scraped_series.keys())}
+
+
+    def to_dict(self):
+        return {
+            'id'        : self.id,
+            'status'    : self.status,
+            'series'    : self.series,
+            'queries'   : self.queries,
+            'rows'      : {series : len(df) for series, df in self.results().items()},
+            'error'     : self.error,
+            'submitted' : self.submitted,
+            'started'   : self.started,
+            'finished'  : self.finished,
+        }
+
+
+class ScrapeService():
+    '''
+    Runs scrape jobs on job_workers (int) threads, each job fetching up to max_workers (int)
+    pages at a time by default, through a shared pool of pool_size (int) connections.
+
+    Finished jobs are kept for job_ttl seconds (None keeps them until evicted), and only
+    the max_finished_jobs (int) most recently finished are kept.
+    '''
+
+    def __init__(self, host='127.0.0.1', port=8765, job_workers=2, max_workers=4, pool_size=16, timeout=(10, 60), cache=None,
+                 max_finished_jobs=100, job_ttl=3600):
+        self.max_workers       = max_workers
+        self.timeout           = timeout
+        self.max_finished_jobs = max_finished_jobs
+        self.job_ttl           = job_ttl
+        self.session     = requests.Session()
+        adapter          = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache       = cache if cache is not None else ResponseCache()
+        self.scraper     = BHOScraper(timeout=timeout, session=self.session, cache=self.cache)
+        self.jobs        = {}
+        self._lock       = threading.Lock()
+        # Held while collecting the catalogue, which must not block job bookkeeping
+        self._warm_lock  = threading.Lock()
+        self._executor   = ThreadPoolExecutor(max_workers=job_workers)
+        handler          = type('ServiceHandler', (_ServiceHandler,), {'service' : self})
+        self._server     = ThreadingHTTPServer((host, port), handler)
+
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+
+    def warm(self):
+        '''
+        Collects the catalogue once, for every job to share.
+        '''
+        with self._warm_lock:
+            if not self.scraper.catalogue:
+                self.scraper.scrape_catalogue()
+
+        return None
+
+
+    def job_scraper(self):
+        '''
+        Returns: a BHOScraper for one job, sharing the warm catalogue, connections and cache
+        '''
+        scraper = BHOScraper(timeout=self.timeout, session=self.session, cache=self.cache)
+        scraper.catalogue = self.scraper.catalogue
+        return scraper
+
+
+    def submit(self, series, queries, max_workers=None):
+        '''
+        Queues a scrape of series (list) for queries (list).
+
+        Returns: ScrapeJob
+        '''
+        if type(series) == str:
+            series = [series]
+        if type(queries) == str:
+            queries = [queries]
+        if not series or not queries:
+            raise ValueError('"series" and "queries" must not be empty.')
+        job = ScrapeJob(list(series), list(queries), max_workers or self.max_workers)
+        self.prune()
+        with self._lock:
+            self.jobs[job.id] = job
+        self._executor.submit(self._run, job)
+
+        return job
+
+
+    def remove(self, job_id):
+        '''
+        Forgets the finished job with id job_id (string), releasing its results.
+
+        Returns: ScrapeJob, or None if there is no such job
+        '''
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if not job.done:
+                raise ValueError('Job "{}" has not finished.'.format(job_id))
+            del self.jobs[job_id]
+            job.scraper = None
+
+        return job
+
+
+    def prune(self):
+        '''
+        Evicts finished jobs older than job_ttl, then the oldest finished jobs beyond
+        max_finished_jobs, releasing their results.
+
+        Returns: list of evicted ScrapeJob
+        '''
+        now = time.time()
+        with self._lock:
+            finished = sorted((job for job in self.jobs.values() if job.done and job.finished is not None), key=lambda job: job.finished)
+            evicted  = [job for job in finished if self.job_ttl is not None and now - job.finished > self.job_ttl]
+            kept     = [job for job in finished if job not in evicted]
+            if self.max_finished_jobs is not None and len(kept) > self.max_finished_jobs:
+                evicted += kept[:len(kept) - self.max_finished_jobs]
+            for job in evicted:
+                del self.jobs[job.id]
+                job.scraper = None
+
+        return evicted
+
+
+    def _run(self, job):
+        job.status  = 'running'
+        job.started = time.time()
+        try:
+            self.warm()
+            job.scraper = self.job_scraper()
+            job.scraper.scrape_series(job.series, job.queries, max_workers=job.max_workers)
+            job.status = 'done'
+        except Exception as e:
+            job.error  = str(e)
+            job.status = 'failed'
+        job.finished = time.time()
+        self.prune()
+
+        return None
+
+
+    def serve_forever(self):
+        print('Serving on {}'.format(self.url))
+        self._server.serve_forever()
+
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+def _records(df, series):
+    '''
+    Returns: list of dicts for the rows of df, with missing values as None
+    '''
+    df = df.astype(object).where(df.notna(), None)
+    records = df.to_dict('records')
+    for record in records:
+        record['series'] = series
+    return records
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    '''
+    Request handler for ScrapeService; "service" is set on a subclass per service.
+    '''
+    service = None
+
+    def do_GET(self):
+        url   = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts == ['status']:
+            return self._send_json(200, {
+                'catalogue' : len(self.service.scraper.catalogue),
+                'jobs'      : len(self.service.jobs),
+                'cache'     : self.service.cache.stats(),
+            })
+        if parts == ['jobs']:
+            return self._send_json(200, [job.to_dict() for job in list(self.service.jobs.values())])
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.jobs.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error' : 'Unknown job "{}".'.format(parts[1])})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == 'results':
+                follow = parse_qs(url.query).get('follow', ['0'])[0] not in ('0', 'false', '')
+                return self._stream_results(job, follow)
+
+        return self._send_json(404, {'error' : 'Not found.'})
+
+
+    def do_POST(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if parts != ['jobs']:
+            return self._send_json(404, {'error' : 'Not found.'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body   = json.loads(self.rfile.read(length) or b'{}')
+            job    = self.service.submit(body.get('series'), body.get('queries'), body.get('max_workers'))
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send_json(400, {'error' : str(e)})
+
+        return self._send_json(202, job.to_dict())
+
+
+    def do_DELETE(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if len(parts) != 2 or parts[0] != 'jobs':
+            return self._send_json(404, {'error' : 'Not found.'})
+        try:
+            job = self.service.remove(parts[1])
+        except ValueError as e:
+            return self._send_json(409, {'error' : str(e)})
+        if job is None:
+            return self._send_json(404, {'error' : 'Unknown job "{}".'.format(parts[1])})
+
+        return self._send_json(200, job.to_dict())
+
+
+    def _stream_results(self, job, follow):
+        '''
+        Writes each scraped row once as a line of JSON. Rows are only ever appended to a
+        series while a job runs, so following a job sends the new tail of each series.
+        '''
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+
+        sent = {}
+        while True:
+            finished = job.done
+            for series, df in job.results().items():
+                start = sent.get(series, 0)
+                for record in _records(df.iloc[start:], series):
+                    self.wfile.write((json.dumps(record) + '\n').encode('utf-8'))
+                sent[series] = len(df)
+            self.wfile.flush()
+            if finished or not follow:
+                break
+            time.sleep(0.5)
+
+        return None
+
+
+    def _send_json(self, status_code, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        return None
+
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,168 @@
+'''
+Binary snapshots of scraper state.
+
+A snapshot is a single Arrow IPC file holding every scraped series as record batches, with
+the catalogue and job metadata in the schema metadata. It is opened memory-mapped and each
+series is only converted to a pandas.DataFrame the first time it is used.
+
+Requires pyarrow (pip install bho_scraper[snapshot]).
+'''
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from collections.abc import MutableMapping
+
+
+SNAPSHOT_VERSION = 1
+METADATA_KEY     = b'bho_scraper'
+# Rows per record batch, bounding the memory used to convert one batch
+BATCH_ROWS       = 65536
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError('Snapshots require pyarrow. Install it with "pip install bho_scraper[snapshot]".')
+    return pyarrow
+
+
+def _text_array(pa, values):
+    '''
+    Returns: pyarrow string array of values (pandas.Series), with missing values as nulls
+    '''
+    try:
+        return pa.Array.from_pandas(values, type=pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Non-text values are stored as their string form
+        values = values.astype(object)
+        return pa.Array.from_pandas(values.where(values.isna(), values.astype(str)), type=pa.string())
+
+
+def save_snapshot(path, catalogue, scraped_series, metadata=None):
+    '''
+    Writes catalogue (dict), scraped_series (dict-like of series_query -> pandas.DataFrame)
+    and metadata (JSON-serializable dict) to a snapshot file at path. Columns are stored as
+    text, as in the per-series .csv files.
+
+    Returns: None
+    '''
+    pa = _import_pyarrow()
+
+    frames  = {series : scraped_series[series] for series in list(scraped_series.keys())}
+    columns = []
+    for df in frames.values():
+        columns.extend(str(column) for column in df.columns if str(column) not in columns)
+    schema = pa.schema([('series', pa.string())] + [(column, pa.string()) for column in columns])
+
+    series_info = {}
+    batches     = []
+    for series, df in frames.items():
+        df = df.copy()
+        df.columns = [str(column) for column in df.columns]
+        info = {'columns' : list(df.columns), 'rows' : len(df), 'batches' : []}
+        arrays = [pa.array([series] * len(df), type=pa.string())]
+        for column in columns:
+            if column in df.columns:
+                arrays.append(_text_array(pa, df[column]))
+            else:
+                arrays.append(pa.nulls(len(df), type=pa.string()))
+        table = pa.Table.from_arrays(arrays, schema=schema)
+        for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+            info['batches'].append(len(batches))
+            batches.append(batch)
+        series_info[series] = info
+
+    header = {
+        'version'   : SNAPSHOT_VERSION,
+        'saved_at'  : time.time(),
+        'catalogue' : catalogue,
+        'series'    : series_info,
+        'metadata'  : metadata or {},
+    }
+    schema = schema.with_metadata({METADATA_KEY : json.dumps(header).encode('utf-8')})
+
+    temp_path = path + '.tmp'
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    os.replace(temp_path, path)
+
+    return None
+
+
+class SnapshotSeries(MutableMapping):
+    '''
+    A dict of series_query -> pandas.DataFrame backed by a memory-mapped snapshot file at
+    path (string). A series is read from the snapshot the first time it is accessed; series
+    that are set or deleted afterwards only change this dict, not the file.
+    '''
+
+    def __init__(self, path):
+        pa = _import_pyarrow()
+        self.path    = path
+        self._source = pa.memory_map(path, 'r')
+        self._reader = pa.ipc.open_file(self._source)
+        header = json.loads(self._reader.schema.metadata[METADATA_KEY].decode('utf-8'))
+        if header.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version: {}'.format(header.get('version')))
+        self.header  = header
+        self._series = dict(header['series'])
+        self._loaded = {}
+
+
+    def _load(self, series):
+        pa   = _import_pyarrow()
+        info = self._series[series]
+        batches = [self._reader.get_batch(i) for i in info['batches']]
+        if batches:
+            table = pa.Table.from_batches(batches).select(info['columns'])
+            df = table.to_pandas()
+        else:
+            df = pd.DataFrame(columns=info['columns'])
+        return df.where(df.notna(), np.nan)
+
+
+    def __getitem__(self, series):
+        if series not in self._loaded:
+            if series not in self._series:
+                raise KeyError(series)
+            self._loaded[series] = self._load(series)
+        return self._loaded[series]
+
+
+    def __setitem__(self, series, df):
+        self._loaded[series] = df
+        if series not in self._series:
+            self._series[series] = None
+
+
+    def __delitem__(self, series):
+        if series not in self._series:
+            raise KeyError(series)
+        del self._series[series]
+        self._loaded.pop(series, None)
+
+
+    def __contains__(self, series):
+        return series in self._series
+
+
+    def __iter__(self):
+        return iter(list(self._series.keys()))
+
+
+    def __len__(self):
+        return len(self._series)
+
+
+    def loaded(self):
+        '''
+        Returns: list of series already read from the snapshot or set since
+        '''
+        return list(self._loaded.keys())
@@ -1,7 +1,9 @@
 import threading
+import time
 import pytest
 
-from flask import Flask
+from flask import Flask, request
+from bho_scraper.recording import recording_key
 from werkzeug.serving import make_server
 from contextlib import contextmanager
 
@@ -32,4 +34,35 @@ class WebServer:
 @pytest.fixture(scope="function")
 def server():
     app = Flask("test")
-    return WebServer(app)
\ No newline at end of file
+    return WebServer(app)
+
+
+class ReplayServer(WebServer):
+    PORT = 1338
+
+    def __init__(self, records, speed=1.0):
+        '''
+        Serves the responses in records (see bho_scraper.recording) by path and query string,
+        each delayed by its recorded latency divided by speed (None for no delay).
+        '''
+        super().__init__(Flask("replay"))
+        self.speed = speed
+        self.responses = {recording_key(record['url']) : record for record in records}
+        self.app.add_url_rule('/', 'replay', self.replay, defaults={'path' : ''})
+        self.app.add_url_rule('/<path:path>', 'replay_path', self.replay)
+
+    def replay(self, path):
+        key = request.path
+        if request.query_string:
+            key += '?' + request.query_string.decode('utf-8')
+        record = self.responses.get(key)
+        if record is None:
+            return 'Not recorded', 404
+        if self.speed:
+            time.sleep(record['elapsed'] / self.speed)
+        return record['body'], record['status_code']
+
+
+@pytest.fixture(scope="function")
+def replay_server():
+    return ReplayServer
\ No newline at end of file
@@ -6,8 +6,11 @@ import pandas as pd
 import numpy as np
 import requests
 import os
+import time
 
 from bho_scraper import bho_scraper
+from bho_scraper.result_store import SQLiteResultStore
+from bho_scraper.profiling import PhaseProfiler
 from flask import Flask, request
 from tests.conftest import WebServer
 
@@ -42,12 +45,12 @@ class Store:
     mock_results_html1 = '''
                             <html><body><div class="region region-content"><div class="view-content">
                             <div>
-                            <h4 class="title"><a>Test Title 1</a></h4>
+                            <h4 class="title"><a href="/vch/test/vol1/pp1-5">Test Title 1</a></h4>
                             <p class="publication">Test Publication 1</p>
                             <p class="excerpt">Test Excerpt 1</p>
                             </div>
                             <div>
-                            <h4 class="title"><a>Test Title 2</a></h4>
+                            <h4 class="title"><a href="/vch/test/vol1/pp1-5#p2">Test Title 2</a></h4>
                             <p class="publication">Test Publication 2</p>
                             </div>
                             <div>
@@ -65,7 +68,8 @@ class Store:
     correct_dict = {
         'title'       : ['Test Title 1', 'Test Title 2', 'Test Title 3', np.nan],
         'publication' : ['Test Publication 1', 'Test Publication 2', np.nan, 'Test Publication 4'],
-        'excerpt'     : ['Test Excerpt 1', np.nan, 'Test Excerpt 3', 'Test Excerpt 4'] 
+        'excerpt'     : ['Test Excerpt 1', np.nan, 'Test Excerpt 3', 'Test Excerpt 4'],
+        'url'         : ['https://hello-world.com/vch/test/vol1/pp1-5', 'https://hello-world.com/vch/test/vol1/pp1-5#p2', np.nan, np.nan]
         }
     correct_df = pd.DataFrame(correct_dict)
 
@@ -73,7 +77,7 @@ class Store:
     mock_results_html2 = '''
                             <html><body><div class="region region-content"><div class="view-content">
                             <div>
-                            <h4 class="title"><a>Hello World</a></h4>
+                            <h4 class="title"><a href="/vch/test/vol2/pp6-9">Hello World</a></h4>
                             <p class="publication">abc 123</p>
                             <p class="excerpt">e = mc ** 2</p>
                             </div></div></body></html>
@@ -85,7 +89,9 @@ class Store:
         'query'       : ['test_query']*5,
         'title'       : ['Test Title 1', 'Test Title 2', 'Test Title 3', np.nan, 'Hello World'],
         'publication' : ['Test Publication 1', 'Test Publication 2', np.nan, 'Test Publication 4', 'abc 123'],
-        'excerpt'     : ['Test Excerpt 1', np.nan, 'Test Excerpt 3', 'Test Excerpt 4', 'e = mc ** 2'] 
+        'excerpt'     : ['Test Excerpt 1', np.nan, 'Test Excerpt 3', 'Test Excerpt 4', 'e = mc ** 2'],
+        'url'         : ['http://127.0.0.1:1337/vch/test/vol1/pp1-5', 'http://127.0.0.1:1337/vch/test/vol1/pp1-5#p2',
+                         np.nan, np.nan, 'http://127.0.0.1:1337/vch/test/vol2/pp6-9']
         }
         )
     correct_scraped_series = {'test_series_name' : correct_scraped_df}
@@ -176,6 +182,12 @@ def scraper_server():
     
         return html
 
+    @server.app.route('/vch/<path:document>', methods=['GET'])
+    def display_document(document):
+        server.documents.append(document)
+        return '<html><body>{}</body></html>'.format(document)
+
+    server.documents = []
     with server.run():
         yield server
 
@@ -245,6 +257,241 @@ def test_scrape_series_download(scraper_server):
         os.remove(csv_path)
         os.rmdir(temp_path)
         raise AssertionError()
-    
 
 
+def test_scrape_series_concurrent(scraper_server):
+
+    def mock_scraper(*args, **kwargs):
+        return MockScraper(scraper_server=scraper_server)
+
+    @mock.patch('bho_scraper.bho_scraper.BHOScraper', side_effect=mock_scraper)
+    def get_scraper(mock_):
+        scraper = bho_scraper.BHOScraper()
+        scraper.scrape_series(['series_a', 'series_b'], ['test_query'], max_workers=4, weights={'series_b' : 2})
+        return scraper
+
+    scraper = get_scraper()
+    assert sorted(scraper.scraped_series.keys()) == ['series_a', 'series_b']
+    correct_df = store.correct_scraped_df.fillna('NaN substitute')
+    for key in scraper.scraped_series.keys():
+        actual_df = scraper.scraped_series[key].fillna('NaN substitute')
+        assert actual_df.equals(correct_df)
+
+
+def test_round_robin():
+    big   = bho_scraper._SeriesJob('big', 'url', 'big', ['q'])
+    small = bho_scraper._SeriesJob('small', 'url', 'small', ['q'], weight=2)
+    big.tasks.extend((0, i) for i in range(1, 4))
+    small.tasks.extend((0, i) for i in range(1, 2))
+
+    schedule = bho_scraper._round_robin([big, small])
+    order = []
+    for item in schedule:
+        if item is None:
+            break
+        order.append((item[0].series_query, item[1][1]))
+
+    assert order == [('big', 0), ('small', 0), ('small', 1), ('big', 1), ('big', 2), ('big', 3)]
+
+
+def test_scrape_series_result_store(scraper_server, tmp_path):
+
+    def mock_scraper(*args, **kwargs):
+        scraper = MockScraper(scraper_server=scraper_server)
+        bho_scraper.BHOScraper.__init__(scraper, result_store=SQLiteResultStore(str(tmp_path / 'results.sqlite')))
+        return scraper
+
+    @mock.patch('bho_scraper.bho_scraper.BHOScraper', side_effect=mock_scraper)
+    def get_scraper(mock_):
+        scraper = bho_scraper.BHOScraper()
+        scraper.scrape_series(['test_series_name'], ['test_query'], path=str(tmp_path))
+        scraper.scrape_series(['test_series_name'], ['test_query'], path=str(tmp_path))
+        return scraper
+
+    scraper = get_scraper()
+    correct_df = store.correct_scraped_df.fillna('NaN substitute')
+    assert list(scraper.scraped_series.keys()) == ['test_series_name']
+    assert scraper.scraped_series['test_series_name'].fillna('NaN substitute').equals(correct_df)
+
+    csv_df = pd.read_csv(str(tmp_path / 'test_series_name.csv')).fillna('NaN substitute')
+    assert csv_df.equals(correct_df)
+
+
+def test_request_timeout_within_deadline():
+    scraper = bho_scraper.BHOScraper(timeout=(5, 30))
+    assert scraper._request_timeout() == (5, 30)
+
+    scraper._deadline_at = time.monotonic() + 2
+    connect, read = scraper._request_timeout()
+    assert 0 < connect <= 2 and 0 < read <= 2
+
+    scraper._deadline_at = time.monotonic() - 1
+    with pytest.raises(bho_scraper.DeadlineExceeded):
+        scraper._request_timeout()
+
+
+def test_scrape_series_deadline(scraper_server):
+
+    def mock_scraper(*args, **kwargs):
+        scraper = MockScraper(scraper_server=scraper_server)
+        scraper.deadline = 0
+        return scraper
+
+    @mock.patch('bho_scraper.bho_scraper.BHOScraper', side_effect=mock_scraper)
+    def get_scraper(mock_):
+        scraper = bho_scraper.BHOScraper()
+        scraper.scrape_series(['test_series_name'], ['test_query'])
+        return scraper
+
+    scraper = get_scraper()
+    assert not scraper.scraped_series
+    assert scraper._deadline_at is None
+
+
+def test_scrape_series_deadline_keeps_fetched_pages(capsys):
+
+    def straggling_get(url, **kwargs):
+        if url.endswith('page=0'):
+            return MockRequest(text=store.mock_results_html1.replace('\n', ''), status_code=200)
+        # The read timeout was clipped to the deadline
+        time.sleep(kwargs['timeout'][1])
+        raise requests.exceptions.ReadTimeout()
+
+    scraper = bho_scraper.BHOScraper(deadline=0.5)
+    scraper.search_for_series = lambda series_query: ('https://hello-world.com/?query={}&page={}', 'test_series_name')
+    with mock.patch('requests.get', side_effect=straggling_get):
+        scraper.scrape_series(['test_series_name'], ['test_query'])
+
+    # The page fetched before the deadline is kept
+    assert len(scraper.scraped_series['test_series_name']) == 4
+    assert 'Deadline reached' in capsys.readouterr().out
+
+
+def test_hedged_fetch():
+    calls = []
+
+    def stalled_first_get(url, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            raise requests.exceptions.ReadTimeout()
+        return MockRequest(text='fast', status_code=200)
+
+    scraper = bho_scraper.BHOScraper(hedge=True)
+    scraper._latencies.extend([0.01] * bho_scraper.HEDGE_MIN_SAMPLES)
+    with mock.patch('requests.get', side_effect=stalled_first_get):
+        r = scraper.fetch('https://hello-world.com/')
+
+    assert r.text == 'fast'
+    assert len(calls) == 2
+
+    # A slow first request that succeeds loses to the hedge
+    calls.clear()
+
+    def slow_first_get(url, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            time.sleep(1)
+            return MockRequest(text='slow', status_code=200)
+        return MockRequest(text='fast', status_code=200)
+
+    with mock.patch('requests.get', side_effect=slow_first_get):
+        start = time.monotonic()
+        r = scraper.fetch('https://hello-world.com/')
+        elapsed = time.monotonic() - start
+
+    assert r.text == 'fast'
+    assert len(calls) == 2
+    assert elapsed < 1
+
+    # A first request finishing within hedge_after is not hedged
+    calls.clear()
+    with mock.patch('requests.get', side_effect=lambda url, **kwargs: calls.append(url) or MockRequest(text='ok', status_code=200)):
+        r = scraper.fetch('https://hello-world.com/')
+        time.sleep(0.1)
+
+    assert r.text == 'ok'
+    assert len(calls) == 1
+
+
+def test_survey(scraper_server):
+
+    def mock_scraper(*args, **kwargs):
+        return MockScraper(scraper_server=scraper_server)
+
+    @mock.patch('bho_scraper.bho_scraper.BHOScraper', side_effect=mock_scraper)
+    def get_scraper(mock_):
+        return bho_scraper.BHOScraper()
+
+    scraper = get_scraper()
+    counts  = scraper.survey(['query_a', 'query_b'], ['series_a', 'series_b'], max_workers=2)
+
+    assert list(counts.index) == ['series_a', 'series_b']
+    assert list(counts.columns) == ['query_a', 'query_b']
+    # 4 results on the first page, which links to 1 further page
+    assert (counts.values == 8).all()
+    assert not scraper.scraped_series
+
+
+def test_survey_errors():
+    pages = {
+        'limited'     : MockRequest(text='<html><body>Too many requests</body></html>', status_code=429),
+        'maintenance' : MockRequest(text='<html><body>Down for maintenance</body></html>', status_code=200),
+        'none'        : MockRequest(text='<div class="region region-content"><p>No results</p></div>', status_code=200),
+    }
+    scraper = bho_scraper.BHOScraper()
+    scraper.search_for_series = lambda series_query: ('https://hello-world.com/?query={}&page={}', 'test_series_name')
+    with mock.patch('requests.get', side_effect=lambda url, **kwargs: pages[url.split('query=')[1].split('&')[0]]):
+        counts = scraper.survey(['limited', 'maintenance', 'none'], ['series_a'])
+
+    # Failed requests and pages that are not results pages are left as NaN
+    assert counts.loc['series_a', ['limited', 'maintenance']].isna().all()
+    assert counts.loc['series_a', 'none'] == 0
+
+
+def test_fetch_documents(scraper_server, tmp_path):
+
+    def mock_scraper(*args, **kwargs):
+        return MockScraper(scraper_server=scraper_server)
+
+    @mock.patch('bho_scraper.bho_scraper.BHOScraper', side_effect=mock_scraper)
+    def get_scraper(mock_):
+        scraper = bho_scraper.BHOScraper()
+        scraper.scrape_series(['series_a', 'series_b'], ['test_query'])
+        return scraper
+
+    scraper = get_scraper()
+    del scraper_server.documents[:]
+    documents = scraper.fetch_documents(str(tmp_path), max_workers=2)
+
+    # Three result urls across both series point at two documents
+    assert sorted(scraper_server.documents) == ['test/vol1/pp1-5', 'test/vol2/pp6-9']
+    assert len(documents) == 3
+    assert documents['sha256'].nunique() == 2
+    for path in documents['path']:
+        assert os.path.exists(path)
+
+    again = scraper.fetch_documents(str(tmp_path))
+    assert len(scraper_server.documents) == 2
+    assert again['sha256'].tolist() == documents['sha256'].tolist()
+
+
+def test_scrape_series_profile(scraper_server, tmp_path):
+
+    def mock_scraper(*args, **kwargs):
+        scraper = MockScraper(scraper_server=scraper_server)
+        scraper.profiler = PhaseProfiler(interval=0.001)
+        scraper.profiler.start()
+        return scraper
+
+    @mock.patch('bho_scraper.bho_scraper.BHOScraper', side_effect=mock_scraper)
+    def get_scraper(mock_):
+        scraper = bho_scraper.BHOScraper()
+        scraper.scrape_series(['test_series_name'], ['test_query'], path=str(tmp_path))
+        return scraper
+
+    scraper = get_scraper()
+    summary = scraper.write_profile(str(tmp_path / 'profile'))
+    assert list(summary.index) == ['pagination', 'fetch', 'parse', 'assembly', 'output']
+    assert summary.loc['fetch', 'calls'] == 2
+    assert os.path.exists(str(tmp_path / 'profile' / 'profile.folded'))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import numpy as np
+
+from bho_scraper.concordance import concordance, concordance_csv
+
+
+class Store:
+    mock_df = pd.DataFrame(
+        {
+        'query'       : ['plague', 'plague', 'Black Death', 'mill'],
+        'title'       : ['Title 1', 'Title 2', 'Title 3', 'Title 4'],
+        'publication' : ['Pub 1', 'Pub 2', 'Pub 3', 'Pub 4'],
+        'excerpt'     : ['The  plague came; the Plague went.\n plague', np.nan, 'in the black   death of 1348', 'no match here'] 
+        }
+        )
+    correct_excerpt     = ['The plague came; the Plague went. plague', np.nan, 'in the black death of 1348', 'no match here']
+    correct_hits        = [3, 0, 1, 0]
+    correct_match_start = [4, -1, 7, -1]
+    correct_match_end   = [10, -1, 18, -1]
+    correct_left        = ['The ', np.nan, 'in the ', np.nan]
+    correct_match       = ['plague', np.nan, 'black death', np.nan]
+    correct_right       = [' came; t', np.nan, ' of 1348', np.nan]
+
+store = Store()
+
+
+def check_concordance(actual_df):
+    assert actual_df['excerpt'].fillna('NaN substitute').tolist() == pd.Series(store.correct_excerpt).fillna('NaN substitute').tolist()
+    assert actual_df['hits'].tolist() == store.correct_hits
+    assert actual_df['match_start'].tolist() == store.correct_match_start
+    assert actual_df['match_end'].tolist() == store.correct_match_end
+    for column in ['left', 'match', 'right']:
+        expected = pd.Series(getattr(store, 'correct_' + column)).fillna('NaN substitute').tolist()
+        assert actual_df[column].fillna('NaN substitute').tolist() == expected
+
+
+def test_concordance():
+    actual_df = concordance(store.mock_df, width=8)
+    check_concordance(actual_df)
+    assert actual_df['title'].tolist() == store.mock_df['title'].tolist()
+
+
+def test_concordance_csv(tmp_path):
+    input_path  = str(tmp_path / 'series.csv')
+    output_path = str(tmp_path / 'series_kwic.csv')
+    store.mock_df.to_csv(input_path, index=False)
+
+    rows = concordance_csv(input_path, output_path, width=8, chunksize=3)
+    assert rows == 4
+
+    actual_df = pd.read_csv(output_path, keep_default_na=False, na_values=[''])
+    check_concordance(actual_df)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+
+from bho_scraper.profiling import PhaseProfiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_phase_profiler(tmp_path):
+    profiler = PhaseProfiler(interval=0.001)
+    profiler.start()
+    with profiler.phase('fetch'):
+        time.sleep(0.05)
+    for _ in range(2):
+        with profiler.phase('parse'):
+            busy(0.05)
+    profiler.stop()
+
+    summary = profiler.summary()
+    assert list(summary.index) == ['fetch', 'parse']
+    assert summary.loc['parse', 'calls'] == 2
+    assert summary.loc['fetch', 'wall_s'] >= 0.05
+    assert summary.loc['parse', 'cpu_s'] > summary.loc['fetch', 'cpu_s']
+    assert summary['samples'].min() > 0
+
+    profiler.write(str(tmp_path))
+    with open(os.path.join(str(tmp_path), 'profile.folded')) as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert stack.split(';')[0] in ('fetch', 'parse')
+        assert int(count) > 0
+    assert any('busy' in line for line in lines if line.startswith('parse;'))
+    assert os.path.exists(os.path.join(str(tmp_path), 'profile_summary.csv'))
+
+
+def test_nested_phases():
+    profiler = PhaseProfiler(interval=0.001)
+    profiler.start()
+    with profiler.phase('pagination'):
+        with profiler.phase('parse'):
+            busy(0.02)
+    profiler.stop()
+
+    summary = profiler.summary()
+    assert summary.loc['pagination', 'wall_s'] >= summary.loc['parse', 'wall_s']
+    # Samples are filed under the innermost phase; the thread is only briefly outside 'parse'
+    assert all(stack.startswith(('parse;', 'pagination;')) for stack in profiler.samples)
+    assert summary.loc['parse', 'samples'] >= summary.loc['pagination', 'samples']
+
+
+def test_sampler_survives_short_phases():
+    profiler = PhaseProfiler(interval=0.0001)
+
+    def toggle(depth):
+        # A deep stack keeps the sampler walking frames while the phase is left
+        if depth:
+            return toggle(depth - 1)
+        end = time.perf_counter() + 0.3
+        while time.perf_counter() < end:
+            with profiler.phase('parse'):
+                pass
+
+    # Switch threads often, so the sampler is interrupted mid-sample
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        profiler.start()
+        toggle(500)
+        alive = profiler._thread.is_alive()
+        profiler.stop()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert alive
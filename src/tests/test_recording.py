@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from flask import Flask, request
+from bho_scraper.recording import TrafficRecorder, load_recording, replay_traffic
+from tests.conftest import WebServer
+from tests.test_bho_scraper import MockScraper, store
+
+
+@pytest.fixture(scope="module")
+def live_pages():
+    app = Flask("live_pages")
+    server = WebServer(app)
+    server.PORT = 1340
+
+    @server.app.route('/', methods=['GET'])
+    def display_page():
+        if request.args.get('page') == '0':
+            return store.mock_results_html1.replace('\n', '')
+        return store.mock_results_html2.replace('\n', '')
+
+    with server.run():
+        yield server
+
+
+def record_scrape(live_pages, tmp_path):
+    recorder = TrafficRecorder()
+    scraper  = MockScraper(live_pages)
+    scraper.recorder = recorder
+    scraper.scrape_series(['test_series_name'], ['test_query'])
+    path = str(tmp_path / 'traffic.jsonl.gz')
+    recorder.save(path)
+    return scraper, load_recording(path)
+
+
+def test_record_and_replay(live_pages, replay_server, tmp_path):
+    live_scraper, records = record_scrape(live_pages, tmp_path)
+    assert [record['url'].split('?')[-1] for record in records] == ['query=test_query&page=0', 'query=test_query&page=1']
+    assert all(record['status_code'] == 200 and record['elapsed'] > 0 for record in records)
+
+    with replay_server(records, speed=None).run() as server:
+        replay_scraper = MockScraper(server)
+        replay_scraper.scrape_series(['test_series_name'], ['test_query'])
+
+    # The parser sees identical pages; only the host in each result url differs
+    live_df   = live_scraper.scraped_series['test_series_name'].drop(columns='url')
+    replay_df = replay_scraper.scraped_series['test_series_name'].drop(columns='url')
+    assert replay_df.fillna('NaN substitute').equals(live_df.fillna('NaN substitute'))
+
+
+def test_replay_traffic(live_pages, replay_server, tmp_path):
+    _, records = record_scrape(live_pages, tmp_path)
+    for record in records:
+        record['elapsed'] = 0.2
+
+    with replay_server(records, speed=4).run() as server:
+        stats = replay_traffic(records, server.url, speed=None, multiplier=5)
+        assert stats['requests'] == 10
+        assert stats['errors'] == 0
+        assert stats['mismatches'] == 0
+        assert 0.05 <= stats['p50'] < 0.2
+
+        missing = replay_traffic([dict(records[0], url=records[0]['url'] + '-missing')], server.url, speed=None)
+        assert missing['errors'] == 1
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import numpy as np
+
+from bho_scraper.result_store import SQLiteResultStore
+
+
+class Store:
+    mock_df = pd.DataFrame(
+        {
+        'query'       : ['q1', 'q1', 'q2'],
+        'title'       : ['Title 1', 'Title 2', np.nan],
+        'publication' : ['Pub 1', np.nan, 'Pub 3'],
+        'excerpt'     : ['Excerpt 1', 'Excerpt 2', ''] 
+        }
+        )
+    mock_new_df = pd.DataFrame(
+        {
+        'query'       : ['q1', 'q2'],
+        'title'       : ['Title 1', 'Title 4'],
+        'publication' : ['Pub 1', 'Pub 4'],
+        'excerpt'     : ['Excerpt 1', 'Excerpt 4'] 
+        }
+        )
+
+store = Store()
+
+
+def test_upsert_deduplicates(tmp_path):
+    result_store = SQLiteResultStore(str(tmp_path / 'results.sqlite'))
+    inserted = result_store.upsert('series', store.mock_df)
+    assert len(inserted) == 3
+
+    inserted = result_store.upsert('series', store.mock_new_df)
+    assert inserted[store.mock_new_df.columns].equals(store.mock_new_df.iloc[[1]].reset_index(drop=True))
+
+    expected = pd.concat([store.mock_df, store.mock_new_df.iloc[[1]]], ignore_index=True)
+    expected['url'] = np.nan
+    actual   = result_store['series']
+    assert actual.fillna('NaN substitute').equals(expected.fillna('NaN substitute'))
+
+
+def test_series_are_separate(tmp_path):
+    result_store = SQLiteResultStore(str(tmp_path / 'results.sqlite'))
+    result_store.upsert('series_b', store.mock_df)
+    result_store.upsert('series_a', store.mock_df)
+    assert list(result_store.keys()) == ['series_b', 'series_a']
+    assert 'series_a' in result_store
+    assert 'series_c' not in result_store
+    assert len(result_store.fetch('series_a', 'q1')) == 2
+
+
+def test_store_persists(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    result_store = SQLiteResultStore(path)
+    result_store.upsert('series', store.mock_df)
+    result_store.close()
+
+    result_store = SQLiteResultStore(path)
+    assert len(result_store.upsert('series', store.mock_df)) == 0
+    assert len(result_store['series']) == 3
+
+
+def test_url_distinguishes_rows(tmp_path):
+    # Rows linking to different documents are kept, as in the in-memory scraped_series
+    result_store = SQLiteResultStore(str(tmp_path / 'results.sqlite'))
+    inserted = result_store.upsert('series', store.mock_new_df.iloc[[0, 0]].assign(url=['http://a', 'http://b']))
+    assert len(inserted) == 2
+    assert result_store['series']['url'].tolist() == ['http://a', 'http://b']
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+import pytest
+import pandas as pd
+import requests
+
+from flask import Flask, request
+from bho_scraper.cache import ResponseCache
+from bho_scraper.service import ScrapeService
+from tests.conftest import WebServer
+from tests.test_bho_scraper import store
+
+
+class MockResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+def test_response_cache_coalesces():
+    cache = ResponseCache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return MockResponse('page')
+
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(cache.get('url', fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [response.text for response in responses] == ['page'] * 5
+    assert cache.get('url', fetch).text == 'page'
+    assert cache.stats() == {'entries' : 1, 'hits' : 1, 'misses' : 1, 'coalesced' : 4}
+
+
+def test_response_cache_skips_errors():
+    cache = ResponseCache()
+    cache.get('url', lambda: MockResponse('error', status_code=500))
+    assert cache.get('url', lambda: MockResponse('page')).text == 'page'
+
+
+@pytest.fixture(scope="module")
+def service_pages():
+    app = Flask("service_pages")
+    server = WebServer(app)
+    server.PORT = 1339
+    server.requests = []
+
+    @server.app.route('/', methods=['GET'])
+    def display_page():
+        server.requests.append(request.args.get('page'))
+        if request.args.get('page') == '0':
+            return store.mock_results_html1.replace('\n', '')
+        return store.mock_results_html2.replace('\n', '')
+
+    with server.run():
+        yield server
+
+
+class MockService(ScrapeService):
+
+    def __init__(self, pages_url):
+        super().__init__(port=0)
+        self.pages_url = pages_url
+
+    def warm(self):
+        pass
+
+    def job_scraper(self):
+        scraper = super().job_scraper()
+        scraper.search_for_series = lambda series_query: (self.pages_url + r'/?query={}&page={}', 'test_series_name')
+        return scraper
+
+
+def wait_for_job(url):
+    for _ in range(100):
+        status = requests.get(url).json()
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError('Job did not finish.')
+
+
+def test_service_jobs(service_pages):
+    service = MockService(service_pages.url)
+    thread  = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    try:
+        job_ids = []
+        for series in ['series_a', 'series_b']:
+            r = requests.post(service.url + '/jobs', json={'series' : [series], 'queries' : ['test_query']})
+            assert r.status_code == 202
+            job_ids.append(r.json()['id'])
+
+        for job_id, series in zip(job_ids, ['series_a', 'series_b']):
+            status = wait_for_job(service.url + '/jobs/' + job_id)
+            assert status['status'] == 'done'
+            assert status['rows'] == {series : 5}
+
+            lines = requests.get(service.url + '/jobs/' + job_id + '/results?follow=1').text.splitlines()
+            rows  = [json.loads(line) for line in lines]
+            assert [row['title'] for row in rows] == [None if pd.isna(title) else title for title in store.correct_scraped_df['title']]
+            assert {row['series'] for row in rows} == {series}
+
+        # Both jobs scraped the same pages, which were only requested once
+        assert sorted(service_pages.requests) == ['0', '1']
+        assert requests.get(service.url + '/status').json()['jobs'] == 2
+        assert requests.get(service.url + '/jobs/unknown').status_code == 404
+        assert requests.post(service.url + '/jobs', json={'series' : []}).status_code == 400
+    finally:
+        service.shutdown()
+
+
+def test_service_job_retention(service_pages):
+    service = MockService(service_pages.url)
+    service.max_finished_jobs = 1
+    thread  = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    try:
+        first = service.submit(['series_a'], ['test_query'])
+        wait_for_job(service.url + '/jobs/' + first.id)
+        second = service.submit(['series_b'], ['test_query'])
+        wait_for_job(service.url + '/jobs/' + second.id)
+
+        # Only the most recently finished job is kept, and evicted jobs drop their results
+        assert list(service.jobs) == [second.id]
+        assert first.scraper is None
+
+        r = requests.delete(service.url + '/jobs/' + second.id)
+        assert r.status_code == 200
+        assert not service.jobs
+        assert second.scraper is None
+        assert requests.delete(service.url + '/jobs/' + second.id).status_code == 404
+
+        service.job_ttl = 0
+        # Jobs past job_ttl are evicted as soon as they finish
+        third = service.submit(['series_a'], ['test_query'])
+        for _ in range(100):
+            if third.id not in service.jobs:
+                break
+            time.sleep(0.05)
+        assert third.done
+        assert third.scraper is None
+    finally:
+        service.shutdown()
+
+
+def test_warm_does_not_block_jobs():
+    service = ScrapeService(port=0)
+    release = threading.Event()
+    service.scraper.scrape_catalogue = lambda: release.wait(5)
+    threading.Thread(target=service.serve_forever, daemon=True).start()
+    thread  = threading.Thread(target=service.warm)
+    thread.start()
+    try:
+        # Job bookkeeping carries on while the catalogue is being collected
+        start = time.monotonic()
+        service.prune()
+        assert service.remove('unknown') is None
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        thread.join()
+        service.shutdown()
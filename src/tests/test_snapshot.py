@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import pandas as pd
+import numpy as np
+
+from bho_scraper import bho_scraper
+
+pytest.importorskip('pyarrow')
+
+
+class Store:
+    mock_catalogue = {'seriesa' : 'https://example.com/a?query={}&page={}'}
+    mock_series_a  = pd.DataFrame(
+        {
+        'query'       : ['q1', 'q1', 'q2'],
+        'title'       : ['Title 1', np.nan, 'Title 3'],
+        'publication' : ['Pub 1', 'Pub 2', np.nan],
+        'excerpt'     : ['Excerpt 1', 'Excerpt 2', 'Excerpt 3'],
+        'url'         : ['http://a/1', np.nan, 'http://a/3']
+        }
+        )
+    mock_series_b  = pd.DataFrame(
+        {
+        'query'       : ['q1'],
+        'title'       : ['Title 4'],
+        'publication' : ['Pub 4'],
+        'excerpt'     : [np.nan]
+        }
+        )
+
+store = Store()
+
+
+def saved_scraper(tmp_path):
+    scraper = bho_scraper.BHOScraper(timeout=(3, 7), deadline=60)
+    scraper.catalogue = dict(store.mock_catalogue)
+    scraper.scraped_series = {'series_a' : store.mock_series_a, 'series_b' : store.mock_series_b}
+    scraper.metadata = {'queries' : ['q1', 'q2']}
+    path = str(tmp_path / 'state.arrow')
+    scraper.save_state(path)
+    return path
+
+
+def test_save_and_load_state(tmp_path):
+    path = saved_scraper(tmp_path)
+
+    scraper = bho_scraper.BHOScraper(deadline=30)
+    scraper.load_state(path)
+    assert scraper.catalogue == store.mock_catalogue
+    assert scraper.metadata == {'queries' : ['q1', 'q2']}
+    # Settings given to the scraper are kept unless asked for
+    assert scraper.timeout == (10, 60)
+    assert scraper.deadline == 30
+    scraper.load_state(path, restore_settings=True)
+    assert scraper.timeout == (3, 7)
+    assert scraper.deadline == 60
+    assert list(scraper.scraped_series.keys()) == ['series_a', 'series_b']
+
+    for key, correct_df in [('series_a', store.mock_series_a), ('series_b', store.mock_series_b)]:
+        actual_df = scraper.scraped_series[key]
+        assert list(actual_df.columns) == list(correct_df.columns)
+        assert actual_df.fillna('NaN substitute').astype(object).equals(correct_df.fillna('NaN substitute').astype(object))
+
+
+def test_load_state_is_lazy(tmp_path):
+    path = saved_scraper(tmp_path)
+
+    scraper = bho_scraper.BHOScraper()
+    scraper.load_state(path)
+    # Membership tests do not read any series
+    assert 'series_a' in scraper.scraped_series
+    assert 'unknown' not in scraper.scraped_series
+    assert scraper.scraped_series.loaded() == []
+    scraper.scraped_series['series_b']
+    assert scraper.scraped_series.loaded() == ['series_b']
+
+    # Scraping more results updates the restored series in memory
+    scraper.scraped_series['series_c'] = store.mock_series_b
+    assert 'series_c' in scraper.scraped_series
+    assert len(scraper.scraped_series) == 3